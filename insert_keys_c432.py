@@ -3,7 +3,9 @@
 #
 # Enter the number of key-gates (e.g., 8, 16) when prompted.
 
-import re
+import heapq
+import mmap
+import os
 import random
 from collections import Counter, namedtuple
 
@@ -29,55 +31,47 @@ def parse_bench_netlist(path):
             if not line or line.startswith("#"):
                 continue
             if line.startswith("INPUT("):
-                name = line[line.find("(") + 1: line.find(")")]
-                inputs.append(name)
+                inputs.append(line[6:-1])
             elif line.startswith("OUTPUT("):
-                name = line[line.find("(") + 1: line.find(")")]
-                outputs.append(name)
+                outputs.append(line[7:-1])
             elif "=" in line:
                 lhs, rhs = line.split("=")
                 lhs = lhs.strip()
                 rhs = rhs.strip()
-                m = re.match(r"([A-Z]+)\((.*)\)", rhs)
-                if not m:
+                op, paren, rest = rhs.partition("(")
+                if not paren or not rest.endswith(")"):
                     raise ValueError(f"Cannot parse RHS: {rhs}")
-                op = m.group(1)
-                args_str = m.group(2).strip()
+                args_str = rest[:-1]    # strip trailing ')'
                 args = [a.strip() for a in args_str.split(",") if a.strip()]
                 gates.append(Gate(lhs, op, args))
     return inputs, outputs, gates
 
 
-def parse_bench_nodes(path):
+# ---------- Parse HOPE log and count fault detections ----------
+
+# First bytes of the indented fault lines in a HOPE log.
+_INDENT_BYTES = (b" ", b"\t")
+
+
+def _valid_fault_names(lines, valid_bytes):
     """
-    Parse only the node names:
-      - primary inputs
-      - primary outputs
-      - left-hand side (LHS) of each gate
-    This is used to align node names with HOPE's log.
+    Yield the node name of every detected fault in the HOPE log lines
+    (bytes) whose node is a key of valid_bytes.
     """
-    inputs = []
-    outputs = []
-    nodes = []
-    with open(path, "r") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if line.startswith("INPUT("):
-                name = line[line.find("(") + 1: line.find(")")]
-                inputs.append(name)
-            elif line.startswith("OUTPUT("):
-                name = line[line.find("(") + 1: line.find(")")]
-                outputs.append(name)
-            elif "=" in line:
-                lhs = line.split("=")[0].strip()
-                nodes.append(lhs)
-    return inputs, outputs, nodes
+    for line in lines:
+        # Dispatch on the first byte only: indented lines list detected
+        # faults; "test" headers and blank lines are skipped unstripped.
+        if line[:1] not in _INDENT_BYTES:
+            continue
+        fields = line.split(None, 1)
+        if not fields:
+            continue
+        # e.g., b"n258" or b"n258->n290"
+        name = valid_bytes.get(fields[0].partition(b"->")[0])
+        if name is not None:
+            yield name
 
 
-# ---------- Parse HOPE log and count fault detections ----------
-
 def parse_hope_counts_filtered(log_path, valid_names):
     """
     Parse HOPE's c432_log and count how many times each node's fault
@@ -87,48 +81,42 @@ def parse_hope_counts_filtered(log_path, valid_names):
     primary inputs, internal nodes, and primary outputs) are counted.
     """
     counts = Counter()
-
-    with open(log_path, "r", errors="ignore") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            # Lines starting with "test" are headers for each test vector; skip them.
-            if line.startswith("test"):
-                continue
-
-            # Indented lines list detected faults for that test.
-            if line[0].isspace():
-                s = line.strip()
-                token = s.split()[0]    # e.g., "n258" or "n258->n290"
-                if "->" in token:
-                    token = token.split("->")[0]
-                token = token.strip()
-                if token in valid_names:
-                    counts[token] += 1
+    # Match raw bytes from the log against the encoded names, so a line
+    # is only decoded (via this lookup) when it names a valid node.
+    valid_bytes = {name.encode(): name for name in valid_names}
+
+    # Map the log rather than copying it through buffered reads; mmap cannot
+    # map an empty file, which simply has nothing to count.
+    with open(log_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return counts
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # mmap.readline splits lines in C straight from the mapping;
+            # Counter.update then tallies the whole stream in C.
+            counts.update(_valid_fault_names(iter(mm.readline, b""), valid_bytes))
 
     return counts
 
 
-def choose_lock_nodes(bench_path, log_path, num_keys):
+def choose_lock_nodes(inputs, outputs, gates, log_path, num_keys):
     """
     Choose nodes to be locked:
-      1) Collect all internal nodes from the .bench (nodes whose LHS starts with 'n').
+      1) Collect all internal nodes from the parsed netlist (gate LHS names starting with 'n').
       2) Use the HOPE log to count the number of fault detections for each node.
-      3) Sort nodes by detection count in descending order and pick the top num_keys.
+      3) Pick the num_keys nodes with the highest detection counts.
     """
-    inputs, outputs, nodes = parse_bench_nodes(bench_path)
-    valid_names = set(inputs + outputs + nodes)
+    nodes = [g.lhs for g in gates]
+    valid_names = set(inputs)
+    valid_names.update(outputs)
+    valid_names.update(nodes)
     counts = parse_hope_counts_filtered(log_path, valid_names)
 
     internal_nodes = [n for n in nodes if n.startswith("n")]
-    # Sort by HOPE detection count (nodes not present in the log are treated as 0).
-    scored = sorted(internal_nodes, key=lambda n: counts.get(n, 0), reverse=True)
-
-    if num_keys <= len(scored):
-        chosen = scored[:num_keys]
-    else:
-        # Should not normally happen: c432 has plenty of internal nodes.
-        chosen = scored
+    # Pick the top num_keys by HOPE detection count (nodes not present in the
+    # log are treated as 0). nlargest only keeps num_keys candidates in a heap,
+    # breaks ties in netlist order like a stable sort, and returns every node
+    # if num_keys exceeds the number of internal nodes.
+    chosen = heapq.nlargest(num_keys, internal_nodes, key=lambda n: counts.get(n, 0))
 
     return chosen, counts
 
@@ -153,19 +141,14 @@ def insert_keys_into_netlist(orig_inputs, orig_outputs, orig_gates, lock_nodes,
     new_inputs = orig_inputs + key_names
     new_outputs = list(orig_outputs)
     new_gates = []
-    # Tracks which nodes have already had their XOR key-gate inserted,
-    # so that downstream uses can be replaced by the locked version.
-    seen_locked = set()
+    # Maps each node whose XOR key-gate has already been inserted to its
+    # locked name; nodes not in it are used as-is, so one dict.get()
+    # per argument rewrites downstream uses.
+    active = {}
 
     for g in orig_gates:
         # Replace inputs in RHS only for nodes that are already locked.
-        new_args = []
-        for a in g.args:
-            if a in seen_locked:
-                locked_name, _ = lock_map[a]
-                new_args.append(locked_name)
-            else:
-                new_args.append(a)
+        new_args = [active.get(a, a) for a in g.args]
 
         new_gates.append(Gate(g.lhs, g.op, new_args))
 
@@ -174,7 +157,7 @@ def insert_keys_into_netlist(orig_inputs, orig_outputs, orig_gates, lock_nodes,
             locked_name, key_name = lock_map[g.lhs]
             # Insert an XOR gate right after: locked = XOR(original, key)
             new_gates.append(Gate(locked_name, "XOR", [g.lhs, key_name]))
-            seen_locked.add(g.lhs)
+            active[g.lhs] = locked_name
 
     return new_inputs, new_outputs, new_gates, key_names
 
@@ -183,15 +166,14 @@ def write_bench_from_netlist(path, inputs, outputs, gates, title="Locked c432"):
     """
     Write the modified netlist back to a .bench file.
     """
+    # Build the whole file in memory and hand it to a single write().
+    parts = [f"# {title}\n"]
+    parts.extend(f"INPUT({name})\n\n" for name in inputs)
+    parts.extend(f"OUTPUT({name})\n\n" for name in outputs)
+    parts.extend(f"{g.lhs:<10} = {g.op}({', '.join(g.args)})\n" for g in gates)
+
     with open(path, "w") as f:
-        f.write(f"# {title}\n")
-        for name in inputs:
-            f.write(f"INPUT({name})\n\n")
-        for name in outputs:
-            f.write(f"OUTPUT({name})\n\n")
-        for g in gates:
-            arg_str = ", ".join(g.args)
-            f.write(f"{g.lhs:<10} = {g.op}({arg_str})\n")
+        f.write("".join(parts))
 
 
 # ---------- main ----------
@@ -203,15 +185,17 @@ def main():
 
     num_keys = int(input("Enter number of key-gates to insert (e.g., 8 or 16): "))
 
-    # 1) Select nodes to be locked
-    lock_nodes, counts = choose_lock_nodes(bench_path, hope_log_path, num_keys)
+    # 1) Read the original netlist (parsed once, reused for node selection)
+    orig_inputs, orig_outputs, orig_gates = parse_bench_netlist(bench_path)
+
+    # 2) Select nodes to be locked
+    lock_nodes, counts = choose_lock_nodes(
+        orig_inputs, orig_outputs, orig_gates, hope_log_path, num_keys
+    )
     print("\n[Info] Selected lock nodes (from most to less detectable faults):")
     for n in lock_nodes:
         print(f"  {n}  (HOPE detections = {counts.get(n, 0)})")
 
-    # 2) Read the original netlist
-    orig_inputs, orig_outputs, orig_gates = parse_bench_netlist(bench_path)
-
     # 3) Insert XOR key-gates
     new_inputs, new_outputs, new_gates, key_names = insert_keys_into_netlist(
         orig_inputs, orig_outputs, orig_gates, lock_nodes
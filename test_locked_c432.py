@@ -15,9 +15,12 @@
 #     c432.bench
 #     c432_locked.bench
 
-import re
+import operator
+import os
 import random
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial, reduce
 
 Gate = namedtuple("Gate", "lhs op args")
 
@@ -44,161 +47,239 @@ def parse_bench_netlist(path):
                 continue
 
             if line.startswith("INPUT("):
-                name = line[line.find("(") + 1 : line.find(")")]
-                inputs.append(name)
+                inputs.append(line[6:-1])
 
             elif line.startswith("OUTPUT("):
-                name = line[line.find("(") + 1 : line.find(")")]
-                outputs.append(name)
+                outputs.append(line[7:-1])
 
             elif "=" in line:
                 lhs, rhs = line.split("=")
                 lhs = lhs.strip()
                 rhs = rhs.strip()
 
-                m = re.match(r"([A-Z]+)\((.*)\)", rhs)
-                if not m:
+                op, paren, rest = rhs.partition("(")
+                if not paren or not rest.endswith(")"):
                     raise ValueError(f"Cannot parse RHS: {rhs}")
 
-                op = m.group(1)
-                args = [a.strip() for a in m.group(2).split(",") if a.strip()]
+                args = [a.strip() for a in rest[:-1].split(",") if a.strip()]
                 gates.append(Gate(lhs, op, args))
 
     return inputs, outputs, gates
 
 
 # ================================================================
-#                     LOGIC GATE EVALUATION
+#                     GATE TYPES
 # ================================================================
+#
+# Each gate type maps to a small integer op id, so compiled netlists
+# never carry or compare op strings.
 
-def eval_gate(op, arg_vals):
-    """Evaluate the logic operation 'op' with input arg_vals."""
-    if op == "AND":
-        v = 1
-        for a in arg_vals: v &= a
-        return v
-
-    if op == "OR":
-        v = 0
-        for a in arg_vals: v |= a
-        return v
+OPS = ("AND", "OR", "NAND", "NOR", "NOT", "BUF", "XOR", "XNOR")
+OP_IDS = {op: i for i, op in enumerate(OPS)}
 
-    if op == "NAND":
-        v = 1
-        for a in arg_vals: v &= a
-        return 1 - v
 
-    if op == "NOR":
-        v = 0
-        for a in arg_vals: v |= a
-        return 1 - v
+# ================================================================
+#              NETLIST COMPILATION (NAMES -> INDICES)
+# ================================================================
 
-    if op == "NOT":
-        return 1 - arg_vals[0]
+CompiledNetlist = namedtuple("CompiledNetlist", "inputs n_nets input_idxs output_idxs gates")
 
-    if op == "BUF":
-        return arg_vals[0]
 
-    if op == "XOR":
-        v = 0
-        for a in arg_vals: v ^= a
-        return v
+def compile_netlist(inputs, outputs, gates):
+    """
+    Assign every net an integer index and rewrite gates as
+    (op_id, lhs_idx, arg_idxs) tuples, so simulation indexes a flat
+    list instead of hashing net names.
 
-    if op == "XNOR":
-        v = 0
-        for a in arg_vals: v ^= a
-        return 1 - v
+    Primary inputs get indices 0..len(inputs)-1 in declaration order.
+    Gates must be listed in topological order (as .bench files are).
+    """
+    index = {name: i for i, name in enumerate(inputs)}
+    if len(index) != len(inputs):
+        raise ValueError("Duplicate primary input name")
+    compiled = []
 
-    raise ValueError(f"Unknown gate type: {op}")
+    for g in gates:
+        if g.op not in OP_IDS:
+            raise ValueError(f"Unknown gate type: {g.op}")
+        for a in g.args:
+            if a not in index:
+                raise KeyError(f"Net {a} used before it is defined")
+        if g.lhs in index:
+            raise ValueError(f"Net {g.lhs} is defined more than once")
+        arg_idxs = tuple(index[a] for a in g.args)
+        index[g.lhs] = len(index)
+        compiled.append((OP_IDS[g.op], index[g.lhs], arg_idxs))
+
+    return CompiledNetlist(
+        inputs=tuple(inputs),
+        n_nets=len(index),
+        input_idxs=tuple(range(len(inputs))),
+        output_idxs=tuple(index[name] for name in outputs),
+        gates=tuple(compiled),
+    )
 
 
-def simulate_bench(inputs, outputs, gates, input_vector):
+# ================================================================
+#              BIT-PARALLEL (MULTI-PATTERN) SIMULATION
+# ================================================================
+#
+# Each net holds one Python int whose bit i is the net's value under
+# pattern i, so every gate is evaluated for all patterns at once.
+# 'mask' has one bit set per pattern and is used for inversion.
+#
+# Rather than interpreting the gate list on every call, each compiled
+# netlist is translated once into a straight-line Python function
+# (one assignment per gate, nets held in local variables) and
+# compiled with compile(); simulation is then a single call.
+
+def _batch_gate_expr(op_id, arg_names):
+    """Python expression for one gate over packed words."""
+    op = OPS[op_id]
+    if op in ("AND", "NAND"):
+        expr = " & ".join(arg_names) or "mask"
+    elif op in ("OR", "NOR"):
+        expr = " | ".join(arg_names) or "0"
+    elif op in ("XOR", "XNOR"):
+        expr = " ^ ".join(arg_names) or "0"
+    else:                                   # NOT, BUF
+        expr = arg_names[0]
+
+    if op in ("NAND", "NOR", "XNOR", "NOT"):
+        return f"({expr}) ^ mask"
+    return expr
+
+
+@lru_cache(maxsize=None)
+def _batch_kernel(netlist):
+    """Generate and compile the straight-line simulator for 'netlist'."""
+    lines = ["def _kernel(input_words, mask):"]
+    if netlist.input_idxs:
+        in_names = ", ".join(f"v{i}" for i in netlist.input_idxs)
+        lines.append(f"    {in_names}, = input_words")
+    for op_id, lhs, arg_idxs in netlist.gates:
+        expr = _batch_gate_expr(op_id, [f"v{a}" for a in arg_idxs])
+        lines.append(f"    v{lhs} = {expr}")
+    out_names = ", ".join(f"v{i}" for i in netlist.output_idxs)
+    lines.append(f"    return [{out_names}]")
+
+    namespace = {}
+    exec(compile("\n".join(lines), "<batch kernel>", "exec"), namespace)
+    return namespace["_kernel"]
+
+
+def simulate_bench_batch(netlist, input_words, mask):
     """
-    Simulate the .bench netlist with the given input vector.
+    Simulate a compiled netlist for many patterns at once.
 
-    input_vector: dict {name : 0/1} for all INPUT nodes.
-    Return: output values in the same order as 'outputs'.
+    input_words: packed pattern words ordered like the netlist's inputs.
+    Return: packed output words in the same order as the netlist's outputs.
     """
-    values = {}
-
-    # Assign primary inputs
-    for name in inputs:
-        if name not in input_vector:
-            raise KeyError(f"Missing input value for {name}")
-        values[name] = input_vector[name]
-
-    # Evaluate gates in listed order (bench uses topological order)
-    for g in gates:
-        arg_vals = [values[a] for a in g.args]
-        values[g.lhs] = eval_gate(g.op, arg_vals)
+    if len(input_words) != len(netlist.inputs):
+        raise ValueError(
+            f"Expected {len(netlist.inputs)} input words, got {len(input_words)}"
+        )
 
-    return [values[name] for name in outputs]
+    return _batch_kernel(netlist)(input_words, mask)
 
 
 # ================================================================
 #                RANDOM INPUT GENERATION & KEY MERGE
 # ================================================================
+#
+# Input vectors are plain lists: logic vectors are ordered like
+# logic_inputs, key values like key_names, and a netlist's full input
+# vector like its INPUT declarations. build_input_table() works out
+# once where each netlist input comes from, so merging is positional.
 
-def random_logic_input_vector(logic_inputs):
-    """Generate a random binary vector for logic-only inputs."""
-    return {name: random.randint(0, 1) for name in logic_inputs}
+LOGIC, KEY = 0, 1
 
 
-def make_locked_input_vector(locked_inputs, logic_vec, key_bits, key_names):
+def build_input_table(net_inputs, logic_inputs, key_names=()):
     """
-    Construct a full input vector for the locked circuit by merging:
-        • logic inputs
-        • key bits
+    Classify each primary input of a netlist once as
+        (LOGIC, column in logic_inputs)  or  (KEY, column in key_names).
     """
-    vec = {}
-    for name in locked_inputs:
-        if name in logic_vec:
-            vec[name] = logic_vec[name]
-        elif name in key_names:
-            idx = key_names.index(name)
-            vec[name] = int(key_bits[idx])
+    logic_col = {name: i for i, name in enumerate(logic_inputs)}
+    key_col = {name: i for i, name in enumerate(key_names)}
+
+    table = []
+    for name in net_inputs:
+        if name in logic_col:
+            table.append((LOGIC, logic_col[name]))
+        elif name in key_col:
+            table.append((KEY, key_col[name]))
         else:
             raise KeyError(f"Unknown input node {name}")
 
-    return vec
+    return table
+
+
+def key_bit_values(key_names, key_bits):
+    """
+    Convert a key string (e.g. "10101010") into 0/1 values ordered like
+    key_names once, so per-pattern merging never re-parses the key.
+    """
+    return [int(key_bits[i]) for i in range(len(key_names))]
+
+
+def make_input_vector(input_table, logic_vec, key_vals=()):
+    """
+    Construct a full input vector for a circuit by merging:
+        • logic inputs
+        • key bits (key_vals from key_bit_values; empty for the original)
+    """
+    sources = (logic_vec, key_vals)
+    return [sources[kind][col] for kind, col in input_table]
+
+
+def random_logic_input_words(logic_inputs, num_patterns):
+    """Generate 'num_patterns' random patterns packed one word per logic input."""
+    return [random.getrandbits(num_patterns) for _ in logic_inputs]
+
+
+def make_input_words(input_table, logic_words, key_vals, mask):
+    """
+    Packed-word counterpart of make_input_vector: key inputs are
+    constant across patterns, so each key word is either all-0 or all-1.
+    """
+    key_words = [mask if v else 0 for v in key_vals]
+    return make_input_vector(input_table, logic_words, key_words)
 
 
 # ================================================================
 #             COMPARISON: ORIGINAL vs LOCKED CIRCUIT
 # ================================================================
 
-def compare_for_key(orig_inputs, orig_outputs, orig_gates,
-                    locked_inputs, locked_outputs, locked_gates,
-                    logic_inputs, key_names, key_bits,
+def compare_for_key(locked_net, input_table, logic_words, gold, key_vals,
                     num_patterns=1000):
     """
-    Compare original vs locked circuit under a given key.
-    Generates 'num_patterns' random input patterns and computes:
+    Compare the locked circuit (compiled) under a given key against the
+    original circuit's outputs on the same patterns.
+
+        input_table  – locked_net's input table, see build_input_table
+        logic_words  – packed logic-input patterns (num_patterns per word)
+        key_vals     – key bits ordered like key_names, see key_bit_values
+        gold         – original circuit's packed outputs for logic_words
+
+    The original circuit does not depend on the key, so callers simulate
+    it once and reuse 'gold' for every key they evaluate.
 
     Returns:
         pattern_mismatch_rate  – fraction of patterns with mismatching outputs
         bit_flip_rate          – fraction of corrupted output bits
     """
-    mismatches = 0
-    total_bits = 0
-    flipped_bits = 0
-
-    for _ in range(num_patterns):
-        lv = random_logic_input_vector(logic_inputs)
-        gold = simulate_bench(orig_inputs, orig_outputs, orig_gates, lv)
-
-        locked_vec = make_locked_input_vector(
-            locked_inputs, lv, key_bits, key_names
-        )
-        locked_out = simulate_bench(locked_inputs, locked_outputs, locked_gates, locked_vec)
-
-        if gold != locked_out:
-            mismatches += 1
-
-        for gb, lb in zip(gold, locked_out):
-            total_bits += 1
-            if gb != lb:
-                flipped_bits += 1
+    # All patterns are simulated together as packed words (see above).
+    mask = (1 << num_patterns) - 1
+    locked_words = make_input_words(input_table, logic_words, key_vals, mask)
+    locked_out = simulate_bench_batch(locked_net, locked_words, mask)
+
+    # Bit i of a diff word is set when pattern i disagrees on that output;
+    # map/sum/reduce keep the per-output work in C.
+    diffs = list(map(operator.xor, gold, locked_out))
+    flipped_bits = sum(map(int.bit_count, diffs))
+    mismatches = reduce(operator.or_, diffs, 0).bit_count()
+    total_bits = num_patterns * len(gold)
 
     return mismatches / num_patterns, (flipped_bits / total_bits)
 
@@ -207,6 +288,10 @@ def compare_for_key(orig_inputs, orig_outputs, orig_gates,
 #                          MAIN TEST FLOW
 # ================================================================
 
+# Below this many wrong keys, scoring runs in-process (see main()).
+PARALLEL_MIN_KEYS = 8
+
+
 def main():
     orig_path = "c432.bench"
     locked_path = "c432_locked.bench"
@@ -218,6 +303,14 @@ def main():
     key_names = [n for n in locked_inputs if n.startswith("k")]
     logic_inputs = [n for n in locked_inputs if not n.startswith("k")]
 
+    # Compile each circuit once; every simulation below reuses it.
+    orig_net = compile_netlist(orig_inputs, orig_outputs, orig_gates)
+    locked_net = compile_netlist(locked_inputs, locked_outputs, locked_gates)
+
+    # Work out once which logic/key column feeds each circuit input.
+    orig_table = build_input_table(orig_inputs, logic_inputs)
+    locked_table = build_input_table(locked_inputs, logic_inputs, key_names)
+
     print("[Info] Original inputs:", orig_inputs)
     print("[Info] Locked inputs  :", locked_inputs)
     print("[Info] Key inputs     :", key_names)
@@ -231,21 +324,22 @@ def main():
     correct_key = "0" * len(key_names)
     print(f"[Test] Verifying functional equivalence under correct key = {correct_key}")
 
-    mismatch_found = False
-    for _ in range(500):
-        lv = random_logic_input_vector(logic_inputs)
-        out_orig = simulate_bench(orig_inputs, orig_outputs, orig_gates, lv)
-        locked_vec = make_locked_input_vector(locked_inputs, lv, correct_key, key_names)
-        out_locked = simulate_bench(locked_inputs, locked_outputs, locked_gates, locked_vec)
-
-        if out_orig != out_locked:
-            mismatch_found = True
-            break
-
-    if mismatch_found:
+    # One packed batch feeds both circuits; the locked view only adds
+    # constant key words on top of the shared logic-input words.
+    num_check = 500
+    check_mask = (1 << num_check) - 1
+    logic_words = random_logic_input_words(logic_inputs, num_check)
+    orig_words = make_input_words(orig_table, logic_words, (), check_mask)
+    locked_words = make_input_words(
+        locked_table, logic_words, key_bit_values(key_names, correct_key), check_mask
+    )
+    out_orig = simulate_bench_batch(orig_net, orig_words, check_mask)
+    out_locked = simulate_bench_batch(locked_net, locked_words, check_mask)
+
+    if out_orig != out_locked:
         print("[FAILED] Locked circuit is NOT equivalent under the correct key.")
     else:
-        print("[PASSED] Locked circuit is functionally equivalent (500 random patterns).")
+        print(f"[PASSED] Locked circuit is functionally equivalent ({num_check} random patterns).")
     print()
 
     # ===============================================================
@@ -257,19 +351,32 @@ def main():
         "1010101010101010"[:len(key_names)],           # alternating pattern
         "00010000".zfill(len(key_names)),              # single-bit error
     ]
+    wrong_keys = [wk for wk in wrong_keys if wk != correct_key]
 
+    # The original circuit's outputs are key-independent: simulate one
+    # pattern batch once and compare every wrong key against it.
     num_patterns = 1000
+    pattern_words = random_logic_input_words(logic_inputs, num_patterns)
+    pattern_mask = (1 << num_patterns) - 1
+    gold = simulate_bench_batch(
+        orig_net, make_input_words(orig_table, pattern_words, (), pattern_mask), pattern_mask
+    )
+
+    # Each wrong key is scored independently against the shared patterns
+    # and gold outputs. Pool start-up costs more than scoring a handful of
+    # keys, so only larger key sets are spread over worker processes.
+    # No randomness is drawn in the workers; results match a serial run.
+    score_key = partial(compare_for_key, locked_net, locked_table, pattern_words, gold,
+                        num_patterns=num_patterns)
+    wrong_key_vals = [key_bit_values(key_names, wk) for wk in wrong_keys]
+    if len(wrong_key_vals) < PARALLEL_MIN_KEYS:
+        results = [score_key(kv) for kv in wrong_key_vals]
+    else:
+        workers = min(len(wrong_key_vals), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(score_key, wrong_key_vals))
 
-    for wk in wrong_keys:
-        if wk == correct_key:
-            continue
-
-        pmr, bfr = compare_for_key(
-            orig_inputs, orig_outputs, orig_gates,
-            locked_inputs, locked_outputs, locked_gates,
-            logic_inputs, key_names, wk, num_patterns=num_patterns
-        )
-
+    for wk, (pmr, bfr) in zip(wrong_keys, results):
         print(f"[Wrong Key] key = {wk}")
         print(f"  Pattern mismatch rate = {pmr:.3f}")
         print(f"  Bit-flip rate         = {bfr:.3f}\n")